@@ -4,7 +4,60 @@ Script de análise do banco de dados SQLite
 """
 from database import Database
 from datetime import datetime, timedelta
+from functools import lru_cache
 import json
+import os
+import sys
+
+try:
+    import readline  # noqa: F401 - histórico e edição de linha no input() (não existe no Windows)
+except ImportError:
+    pass
+
+# Queries fixas das análises customizadas: deixam as funções mais legíveis e dão ao
+# cached_query uma chave de lru_cache estável (o mesmo texto de SQL a cada chamada)
+_SQL_BY_REASON = '''
+    SELECT reason, COUNT(*) as count, 
+           SUM(pnl_usdt) as total_pnl,
+           AVG(pnl_pct) as avg_pnl
+    FROM trades
+    GROUP BY reason
+    ORDER BY count DESC
+'''
+
+_SQL_DURATION = '''
+    SELECT 
+        AVG(duration_seconds) as avg_duration,
+        MIN(duration_seconds) as min_duration,
+        MAX(duration_seconds) as max_duration
+    FROM trades
+    WHERE duration_seconds IS NOT NULL
+'''
+
+_SQL_BEST_WORST_DAY = '''
+    SELECT * FROM (
+        SELECT date, total_pnl_usdt, total_trades
+        FROM daily_performance
+        ORDER BY total_pnl_usdt DESC
+        LIMIT 1
+    )
+    UNION ALL
+    SELECT * FROM (
+        SELECT date, total_pnl_usdt, total_trades
+        FROM daily_performance
+        ORDER BY total_pnl_usdt ASC
+        LIMIT 1
+    )
+'''
+
+# Templates das linhas das tabelas (formatados uma vez por linha e escritos de uma só vez)
+_TRADE_ROW_FMT = "%-5d %-10s $%-11.8f $%-11.8f %-9.2f%% $%-11.2f %-15s"
+_SIGNAL_ROW_FMT = "%-5d %-10s %-8s $%-11.8f %-10s %-10s"
+_DAILY_ROW_FMT = "%-12s %-8d %-9.2f%% $%-14.2f %-11.2f%%"
+
+def print_rows(lines):
+    """Escreve todas as linhas da tabela com uma única chamada de write"""
+    sys.stdout.write("".join(line + "\n" for line in lines))
 
 def print_separator(title: str = ""):
     """Imprime separador visual"""
@@ -13,6 +66,23 @@ def print_separator(title: str = ""):
         print(f"  {title}")
         print("="*60)
 
+@lru_cache(maxsize=32)
+def _cached_query(db: Database, query: str, db_mtime: float) -> list:
+    """Executa query; o mtime do arquivo na chave invalida o cache quando o banco muda"""
+    return db.execute_query(query)
+
+def _db_mtime(db: Database) -> float:
+    """Última modificação do banco (inclui o arquivo -wal, onde ficam as escritas recentes)"""
+    wal_file = db.db_file + '-wal'
+    mtime = os.path.getmtime(db.db_file)
+    if os.path.exists(wal_file):
+        mtime = max(mtime, os.path.getmtime(wal_file))
+    return mtime
+
+def cached_query(db: Database, query: str) -> list:
+    """Executa query reaproveitando o resultado enquanto o banco não for alterado"""
+    return _cached_query(db, query, _db_mtime(db))
+
 def analyze_trades(db: Database):
     """Análise completa de trades"""
     print_separator("📊 ANÁLISE DE TRADES")
@@ -49,24 +119,24 @@ def analyze_trades(db: Database):
     if recent_trades:
         print(f"{'ID':<5} {'Símbolo':<10} {'Entrada':<12} {'Saída':<12} {'PnL %':<10} {'PnL $':<12} {'Razão':<15}")
         print("-" * 80)
-        for trade in recent_trades:
-            print(f"{trade['id']:<5} {trade['symbol']:<10} ${trade['entry_price']:<11.8f} "
-                  f"${trade['exit_price']:<11.8f} {trade['pnl_pct']:<9.2f}% "
-                  f"${trade['pnl_usdt']:<11.2f} {trade['reason']:<15}")
+        print_rows(
+            _TRADE_ROW_FMT % (trade['id'], trade['symbol'], trade['entry_price'], trade['exit_price'],
+                              trade['pnl_pct'], trade['pnl_usdt'], trade['reason'])
+            for trade in recent_trades
+        )
 
 def analyze_signals(db: Database):
     """Análise de sinais"""
     print_separator("🔔 ANÁLISE DE SINAIS")
     
-    # Total de sinais
-    all_signals = db.get_signals(limit=1000)
-    executed_signals = db.get_signals(executed=True, limit=1000)
-    not_executed = db.get_signals(executed=False, limit=1000)
+    # Contagens agregadas direto no SQL (sem buscar as linhas)
+    total_signals, executed_signals = db.get_signal_counts()
+    not_executed = total_signals - executed_signals
     
     print(f"\n📊 ESTATÍSTICAS DE SINAIS")
-    print(f"  Total de sinais: {len(all_signals)}")
-    print(f"  Sinais executados: {len(executed_signals)} ({len(executed_signals)/len(all_signals)*100 if all_signals else 0:.1f}%)")
-    print(f"  Sinais não executados: {len(not_executed)} ({len(not_executed)/len(all_signals)*100 if all_signals else 0:.1f}%)")
+    print(f"  Total de sinais: {total_signals}")
+    print(f"  Sinais executados: {executed_signals} ({executed_signals/total_signals*100 if total_signals else 0:.1f}%)")
+    print(f"  Sinais não executados: {not_executed} ({not_executed/total_signals*100 if total_signals else 0:.1f}%)")
     
     # Últimos 10 sinais
     print_separator("📋 ÚLTIMOS 10 SINAIS")
@@ -75,11 +145,12 @@ def analyze_signals(db: Database):
     if recent_signals:
         print(f"{'ID':<5} {'Símbolo':<10} {'Tipo':<8} {'Preço':<12} {'Executado':<10} {'Trade ID':<10}")
         print("-" * 70)
-        for signal in recent_signals:
-            executed = "✅ Sim" if signal['executed'] else "❌ Não"
-            trade_id = signal['trade_id'] if signal['trade_id'] else "-"
-            print(f"{signal['id']:<5} {signal['symbol']:<10} {signal['signal_type']:<8} "
-                  f"${signal['price']:<11.8f} {executed:<10} {trade_id:<10}")
+        print_rows(
+            _SIGNAL_ROW_FMT % (signal['id'], signal['symbol'], signal['signal_type'], signal['price'],
+                               "✅ Sim" if signal['executed'] else "❌ Não",
+                               signal['trade_id'] if signal['trade_id'] else "-")
+            for signal in recent_signals
+        )
 
 def analyze_daily_performance(db: Database, days: int = 30):
     """Análise de performance diária"""
@@ -94,21 +165,20 @@ def analyze_daily_performance(db: Database, days: int = 30):
     print(f"\n{'Data':<12} {'Trades':<8} {'Win Rate':<10} {'PnL Total $':<15} {'PnL Médio %':<12}")
     print("-" * 70)
     
-    for day in daily:
-        print(f"{day['date']:<12} {day['total_trades']:<8} {day['win_rate']:<9.2f}% "
-              f"${day['total_pnl_usdt']:<14.2f} {day['avg_pnl_pct']:<11.2f}%")
+    print_rows(
+        _DAILY_ROW_FMT % (day['date'], day['total_trades'], day['win_rate'],
+                          day['total_pnl_usdt'], day['avg_pnl_pct'])
+        for day in daily
+    )
     
-    # Resumo
-    total_days = len(daily)
-    total_trades = sum(d['total_trades'] for d in daily)
-    total_pnl = sum(d['total_pnl_usdt'] for d in daily)
-    avg_win_rate = sum(d['win_rate'] for d in daily) / total_days if total_days > 0 else 0
+    # Resumo (agregado no SQL)
+    summary = db.get_daily_summary(days=days)
     
     print(f"\n📊 RESUMO ({days} dias):")
-    print(f"  Dias com trades: {total_days}")
-    print(f"  Total de trades: {total_trades}")
-    print(f"  PnL Total: ${total_pnl:.2f}")
-    print(f"  Win Rate Médio: {avg_win_rate:.2f}%")
+    print(f"  Dias com trades: {summary['total_days']}")
+    print(f"  Total de trades: {summary['total_trades']}")
+    print(f"  PnL Total: ${summary['total_pnl_usdt']:.2f}")
+    print(f"  Win Rate Médio: {summary['avg_win_rate']:.2f}%")
 
 def custom_queries(db: Database):
     """Exemplos de queries customizadas para aprendizado"""
@@ -116,14 +186,7 @@ def custom_queries(db: Database):
     
     # Query 1: Trades por razão de saída
     print("\n1️⃣ Trades por razão de saída:")
-    result = db.execute_query('''
-        SELECT reason, COUNT(*) as count, 
-               SUM(pnl_usdt) as total_pnl,
-               AVG(pnl_pct) as avg_pnl
-        FROM trades
-        GROUP BY reason
-        ORDER BY count DESC
-    ''')
+    result = cached_query(db, _SQL_BY_REASON)
     
     for row in result:
         print(f"  {row['reason']}: {row['count']} trades | "
@@ -132,14 +195,7 @@ def custom_queries(db: Database):
     
     # Query 2: Duração média dos trades
     print("\n2️⃣ Duração média dos trades:")
-    result = db.execute_query('''
-        SELECT 
-            AVG(duration_seconds) as avg_duration,
-            MIN(duration_seconds) as min_duration,
-            MAX(duration_seconds) as max_duration
-        FROM trades
-        WHERE duration_seconds IS NOT NULL
-    ''')
+    result = cached_query(db, _SQL_DURATION)
     
     if result:
         row = result[0]
@@ -150,28 +206,13 @@ def custom_queries(db: Database):
         print(f"  Mínima: {min_min:.2f} minutos")
         print(f"  Máxima: {max_min:.2f} minutos")
     
-    # Query 3: Melhor e pior dia
+    # Query 3: Melhor e pior dia (uma única query com UNION ALL)
     print("\n3️⃣ Melhor e pior dia:")
-    result = db.execute_query('''
-        SELECT date, total_pnl_usdt, total_trades
-        FROM daily_performance
-        ORDER BY total_pnl_usdt DESC
-        LIMIT 1
-    ''')
+    result = cached_query(db, _SQL_BEST_WORST_DAY)
     
     if result:
-        best = result[0]
+        best, worst = result[0], result[-1]
         print(f"  Melhor dia: {best['date']} | PnL: ${best['total_pnl_usdt']:.2f} | Trades: {best['total_trades']}")
-    
-    result = db.execute_query('''
-        SELECT date, total_pnl_usdt, total_trades
-        FROM daily_performance
-        ORDER BY total_pnl_usdt ASC
-        LIMIT 1
-    ''')
-    
-    if result:
-        worst = result[0]
         print(f"  Pior dia: {worst['date']} | PnL: ${worst['total_pnl_usdt']:.2f} | Trades: {worst['total_trades']}")
 
 def show_table_structure(db: Database):
@@ -190,6 +231,31 @@ def show_table_structure(db: Database):
                 nullable = "Sim" if col['notnull'] == 0 else "Não"
                 print(f"  {col['name']:<20} {col['type']:<15} {nullable:<10}")
 
+def analyze_daily_performance_prompt(db: Database):
+    """Pergunta o período e mostra a performance diária"""
+    days = input("Quantos dias? (padrão: 30): ").strip()
+    days = int(days) if days.isdigit() else 30
+    analyze_daily_performance(db, days)
+
+def full_analysis(db: Database):
+    """Executa todas as análises"""
+    # Todas as leituras em uma única conexão/snapshot
+    with db.read_transaction():
+        analyze_trades(db)
+        analyze_signals(db)
+        analyze_daily_performance(db)
+        custom_queries(db)
+
+# Opções do menu: tecla -> (descrição, função de análise)
+MENU_OPTIONS = {
+    '1': ("Análise de Trades", analyze_trades),
+    '2': ("Análise de Sinais", analyze_signals),
+    '3': ("Performance Diária", analyze_daily_performance_prompt),
+    '4': ("Queries Customizadas", custom_queries),
+    '5': ("Estrutura do Banco", show_table_structure),
+    '6': ("Análise Completa", full_analysis),
+}
+
 def main():
     """Função principal"""
     print("\n" + "="*60)
@@ -202,36 +268,19 @@ def main():
         # Menu interativo
         while True:
             print("\n📋 MENU DE ANÁLISES:")
-            print("  1. Análise de Trades")
-            print("  2. Análise de Sinais")
-            print("  3. Performance Diária")
-            print("  4. Queries Customizadas")
-            print("  5. Estrutura do Banco")
-            print("  6. Análise Completa")
+            for key, (label, _) in MENU_OPTIONS.items():
+                print(f"  {key}. {label}")
             print("  0. Sair")
             
             choice = input("\nEscolha uma opção: ").strip()
             
-            if choice == '1':
-                analyze_trades(db)
-            elif choice == '2':
-                analyze_signals(db)
-            elif choice == '3':
-                days = input("Quantos dias? (padrão: 30): ").strip()
-                days = int(days) if days.isdigit() else 30
-                analyze_daily_performance(db, days)
-            elif choice == '4':
-                custom_queries(db)
-            elif choice == '5':
-                show_table_structure(db)
-            elif choice == '6':
-                analyze_trades(db)
-                analyze_signals(db)
-                analyze_daily_performance(db)
-                custom_queries(db)
-            elif choice == '0':
+            if choice == '0':
                 print("\n👋 Até logo!")
                 break
+            
+            option = MENU_OPTIONS.get(choice)
+            if option:
+                option[1](db)
             else:
                 print("❌ Opção inválida!")
     
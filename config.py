@@ -22,7 +22,7 @@ class Config:
     MAX_PAIRS = int(os.getenv('MAX_PAIRS', '3'))
     
     # Stablecoins para excluir (não servem para scalping)
-    EXCLUDED_SYMBOLS = ['USDCUSDT', 'BUSDUSDT', 'TUSDUSDT', 'USDPUSDT', 'FDUSDUSDT']
+    EXCLUDED_SYMBOLS = frozenset({'USDCUSDT', 'BUSDUSDT', 'TUSDUSDT', 'USDPUSDT', 'FDUSDUSDT'})
     
     # Strategy
     TIMEFRAME_ENTRY = os.getenv('TIMEFRAME_ENTRY', '1m')
@@ -30,6 +30,8 @@ class Config:
     EMA_FAST = int(os.getenv('EMA_FAST', '9'))
     EMA_SLOW = int(os.getenv('EMA_SLOW', '21'))
     VOLUME_PERIOD = int(os.getenv('VOLUME_PERIOD', '20'))
+    ER_PERIOD = int(os.getenv('ER_PERIOD', '14'))  # Candles do Efficiency Ratio
+    MIN_EFFICIENCY_RATIO = float(os.getenv('MIN_EFFICIENCY_RATIO', '0.3'))  # 0 desativa o filtro
     
     # Risk Management
     TAKE_PROFIT_PCT = float(os.getenv('TAKE_PROFIT_PCT', '0.5'))
@@ -57,4 +59,25 @@ class Config:
     # Fallback: usar polling se WebSocket falhar
     USE_WEBSOCKET = os.getenv('USE_WEBSOCKET', 'true').lower() == 'true'
     POLLING_INTERVAL = int(os.getenv('POLLING_INTERVAL', '5'))  # Segundos entre polls
-
+    WS_PING_TIMEOUT = 10  # Segundos sem pong até a conexão cair
+    WS_PING_INTERVAL = int(os.getenv('WS_PING_INTERVAL', '60'))  # Segundos entre pings (0 desativa)
+    
+    # Conexões HTTP reaproveitadas pelo cliente REST (scanner usa até 10 threads)
+    HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '20'))
+    
+    @classmethod
+    def validate_ws_ping(cls):
+        """
+        Garante WS_PING_INTERVAL válido para o run_forever (0 ou maior que WS_PING_TIMEOUT)
+        
+        O websocket-client recusa ping_interval <= ping_timeout antes de conectar: a thread
+        do stream morreria sem passar pelo _on_error. Ajusta o valor e avisa o usuário.
+        """
+        if cls.WS_PING_INTERVAL < 0:
+            print(f"⚠️ WS_PING_INTERVAL={cls.WS_PING_INTERVAL} inválido: ping desativado (0)")
+            cls.WS_PING_INTERVAL = 0
+        elif 0 < cls.WS_PING_INTERVAL <= cls.WS_PING_TIMEOUT:
+            adjusted = cls.WS_PING_TIMEOUT + 1
+            print(f"⚠️ WS_PING_INTERVAL={cls.WS_PING_INTERVAL} precisa ser maior que o timeout do pong "
+                  f"({cls.WS_PING_TIMEOUT}s): usando {adjusted}s")
+            cls.WS_PING_INTERVAL = adjusted
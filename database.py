@@ -3,27 +3,74 @@ Módulo de gerenciamento do banco de dados SQLite
 Sistema completo para aprendizado e análise de trades
 """
 import sqlite3
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from config import Config
 import os
+import threading
 
 class Database:
     """Gerenciador do banco de dados SQLite"""
     
     def __init__(self, db_file: str = None):
         self.db_file = db_file or Config.DB_FILE
+        # Conexão da read_transaction ativa, por thread: o mesmo Database é usado pela
+        # thread de escrita do logger e pela de callbacks, e sqlite3 não aceita conexão compartilhada
+        self._local = threading.local()
         self._init_database()
     
+    @property
+    def _shared_conn(self) -> Optional[sqlite3.Connection]:
+        """Conexão da read_transaction ativa nesta thread (se houver)"""
+        return getattr(self._local, 'conn', None)
+    
     def _get_connection(self):
-        """Cria conexão com o banco"""
-        return sqlite3.connect(self.db_file)
+        """Cria conexão com o banco (ou reaproveita a da read_transaction ativa)"""
+        if self._shared_conn is not None:
+            return self._shared_conn
+        
+        conn = sqlite3.connect(self.db_file)
+        # Não fica salvo no arquivo (ao contrário do WAL): vale por conexão e define o custo do commit
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+    
+    def _release_connection(self, conn):
+        """Fecha a conexão, exceto se pertencer à read_transaction ativa"""
+        if conn is not self._shared_conn:
+            conn.close()
+    
+    @contextmanager
+    def read_transaction(self):
+        """
+        Executa várias leituras em uma única conexão e transação
+        
+        Todas as consultas feitas dentro do bloco veem o mesmo snapshot do banco
+        e reaproveitam o cache de páginas da conexão
+        """
+        conn = self._get_connection()
+        if conn is self._shared_conn:
+            # Já existe transação ativa: apenas reaproveita
+            yield conn
+            return
+        
+        conn.execute('BEGIN')
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            conn.rollback()
+            conn.close()
     
     def _init_database(self):
         """Inicializa todas as tabelas do banco"""
         conn = self._get_connection()
         cursor = conn.cursor()
         
+        # WAL: leitores (ex: analyze_db) não bloqueiam o bot gravando trades
+        cursor.execute('PRAGMA journal_mode=WAL')
+        
         # Tabela de trades (já existente, mas melhorada)
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS trades (
@@ -110,7 +157,7 @@ class Database:
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_daily_performance_date ON daily_performance(date)')
         
         conn.commit()
-        conn.close()
+        self._release_connection(conn)
         print(f"✅ Banco de dados inicializado: {self.db_file}")
     
     # ==================== TRADES ====================
@@ -120,6 +167,9 @@ class Database:
         conn = self._get_connection()
         cursor = conn.cursor()
         
+        # Só gera o timestamp se o trade não trouxer um (e usa o mesmo valor na performance diária)
+        timestamp = trade_data.get('timestamp') or datetime.now().isoformat()
+        
         try:
             cursor.execute('''
                 INSERT INTO trades (
@@ -128,7 +178,7 @@ class Database:
                     reason, strategy, volume, stop_loss_pct, take_profit_pct
                 ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (
-                trade_data.get('timestamp', datetime.now().isoformat()),
+                timestamp,
                 trade_data['symbol'],
                 trade_data['entry_price'],
                 trade_data['exit_price'],
@@ -146,10 +196,10 @@ class Database:
             ))
             
             trade_id = cursor.lastrowid
-            conn.commit()
             
-            # Atualiza performance diária
-            self._update_daily_performance(trade_data)
+            # Atualiza performance diária na mesma transação: um único commit por trade
+            self._update_daily_performance(cursor, trade_data, timestamp)
+            conn.commit()
             
             return trade_id
             
@@ -157,7 +207,7 @@ class Database:
             conn.rollback()
             raise e
         finally:
-            conn.close()
+            self._release_connection(conn)
     
     def get_trades(self, limit: int = 100, symbol: str = None, 
                    start_date: str = None, end_date: str = None) -> List[Dict]:
@@ -186,7 +236,7 @@ class Database:
         
         cursor.execute(query, params)
         rows = cursor.fetchall()
-        conn.close()
+        self._release_connection(conn)
         
         return [dict(row) for row in rows]
     
@@ -204,7 +254,7 @@ class Database:
                     ema_fast, ema_slow, volume, volume_avg
                 ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             ''', (
-                signal_data.get('timestamp', datetime.now().isoformat()),
+                signal_data.get('timestamp') or datetime.now().isoformat(),
                 signal_data['symbol'],
                 signal_data.get('signal_type', 'BUY'),
                 signal_data['price'],
@@ -222,7 +272,7 @@ class Database:
             conn.rollback()
             raise e
         finally:
-            conn.close()
+            self._release_connection(conn)
     
     def mark_signal_executed(self, signal_id: int, trade_id: int):
         """Marca sinal como executado e associa ao trade"""
@@ -236,7 +286,7 @@ class Database:
         ''', (trade_id, signal_id))
         
         conn.commit()
-        conn.close()
+        self._release_connection(conn)
     
     def get_signals(self, symbol: str = None, executed: bool = None, 
                     limit: int = 100) -> List[Dict]:
@@ -261,10 +311,24 @@ class Database:
         
         cursor.execute(query, params)
         rows = cursor.fetchall()
-        conn.close()
+        self._release_connection(conn)
         
         return [dict(row) for row in rows]
     
+    def get_signal_counts(self) -> Tuple[int, int]:
+        """Retorna (total de sinais, sinais executados) em uma única query"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT COUNT(*), COALESCE(SUM(CASE WHEN executed THEN 1 ELSE 0 END), 0)
+            FROM signals
+        ''')
+        total, executed = cursor.fetchone()
+        self._release_connection(conn)
+        
+        return total, executed
+    
     # ==================== STATISTICS ====================
     
     def get_statistics(self, days: int = None) -> Dict:
@@ -272,71 +336,56 @@ class Database:
         conn = self._get_connection()
         cursor = conn.cursor()
         
-        query = "SELECT * FROM trades WHERE 1=1"
+        where = "WHERE 1=1"
         params = []
         
         if days:
             start_date = (datetime.now() - timedelta(days=days)).isoformat()
-            query += " AND timestamp >= ?"
+            where += " AND timestamp >= ?"
             params.append(start_date)
         
-        # Total de trades
-        cursor.execute(f"SELECT COUNT(*) FROM ({query})", params)
-        total_trades = cursor.fetchone()[0]
+        # Todas as métricas gerais em uma única passada pela tabela
+        cursor.execute(f"""
+            SELECT
+                COUNT(*),
+                SUM(CASE WHEN pnl_pct > 0 THEN 1 ELSE 0 END),
+                SUM(CASE WHEN pnl_pct < 0 THEN 1 ELSE 0 END),
+                SUM(pnl_usdt),
+                AVG(pnl_pct),
+                MAX(pnl_pct),
+                MIN(pnl_pct)
+            FROM trades {where}
+        """, params)
+        (total_trades, winning_trades, losing_trades,
+         total_pnl, avg_pnl_pct, best_pnl, worst_pnl) = cursor.fetchone()
         
         if total_trades == 0:
-            conn.close()
+            self._release_connection(conn)
             return {}
         
-        # Trades vencedores
-        cursor.execute(f"{query} AND pnl_pct > 0", params)
-        winning_trades = len(cursor.fetchall())
-        
-        # Trades perdedores
-        cursor.execute(f"{query} AND pnl_pct < 0", params)
-        losing_trades = len(cursor.fetchall())
-        
         # Win rate
         win_rate = (winning_trades / total_trades * 100) if total_trades > 0 else 0
         
-        # PnL total
-        cursor.execute(f"SELECT SUM(pnl_usdt) FROM ({query})", params)
-        total_pnl = cursor.fetchone()[0] or 0
-        
-        # PnL médio
-        cursor.execute(f"SELECT AVG(pnl_pct) FROM ({query})", params)
-        avg_pnl_pct = cursor.fetchone()[0] or 0
-        
-        # Melhor trade
-        cursor.execute(f"{query} ORDER BY pnl_pct DESC LIMIT 1", params)
-        best_trade = cursor.fetchone()
-        best_pnl = best_trade[6] if best_trade else 0
-        
-        # Pior trade
-        cursor.execute(f"{query} ORDER BY pnl_pct ASC LIMIT 1", params)
-        worst_trade = cursor.fetchone()
-        worst_pnl = worst_trade[6] if worst_trade else 0
-        
         # Por símbolo
         cursor.execute(f"""
             SELECT symbol, COUNT(*), SUM(pnl_usdt), AVG(pnl_pct)
-            FROM ({query})
+            FROM trades {where}
             GROUP BY symbol
             ORDER BY SUM(pnl_usdt) DESC
         """, params)
         by_symbol = cursor.fetchall()
         
-        conn.close()
+        self._release_connection(conn)
         
         return {
             'total_trades': total_trades,
             'winning_trades': winning_trades,
             'losing_trades': losing_trades,
             'win_rate': win_rate,
-            'total_pnl_usdt': total_pnl,
-            'avg_pnl_pct': avg_pnl_pct,
-            'best_trade_pct': best_pnl,
-            'worst_trade_pct': worst_pnl,
+            'total_pnl_usdt': total_pnl or 0,
+            'avg_pnl_pct': avg_pnl_pct or 0,
+            'best_trade_pct': best_pnl or 0,
+            'worst_trade_pct': worst_pnl or 0,
             'by_symbol': [
                 {'symbol': s[0], 'trades': s[1], 'pnl_usdt': s[2] or 0, 'avg_pnl_pct': s[3] or 0}
                 for s in by_symbol
@@ -358,17 +407,37 @@ class Database:
         ''', (start_date,))
         
         rows = cursor.fetchall()
-        conn.close()
+        self._release_connection(conn)
         
         return [dict(row) for row in rows]
     
-    def _update_daily_performance(self, trade_data: Dict):
-        """Atualiza performance diária após um trade"""
+    def get_daily_summary(self, days: int = 30) -> Dict:
+        """Retorna resumo agregado da performance diária do período"""
         conn = self._get_connection()
         cursor = conn.cursor()
         
+        start_date = (datetime.now() - timedelta(days=days)).date().isoformat()
+        
+        cursor.execute('''
+            SELECT COUNT(*), SUM(total_trades), SUM(total_pnl_usdt), AVG(win_rate)
+            FROM daily_performance
+            WHERE date >= ?
+        ''', (start_date,))
+        
+        total_days, total_trades, total_pnl, avg_win_rate = cursor.fetchone()
+        self._release_connection(conn)
+        
+        return {
+            'total_days': total_days,
+            'total_trades': total_trades or 0,
+            'total_pnl_usdt': total_pnl or 0,
+            'avg_win_rate': avg_win_rate or 0
+        }
+    
+    def _update_daily_performance(self, cursor: sqlite3.Cursor, trade_data: Dict, timestamp: str):
+        """Atualiza performance diária após um trade (commit fica a cargo de quem chama)"""
         # Extrai data do trade
-        trade_date = datetime.fromisoformat(trade_data['timestamp']).date().isoformat()
+        trade_date = datetime.fromisoformat(timestamp).date().isoformat()
         
         # Verifica se já existe registro do dia
         cursor.execute('SELECT * FROM daily_performance WHERE date = ?', (trade_date,))
@@ -424,9 +493,6 @@ class Database:
                 END
             WHERE date = ?
         ''', (trade_date,))
-        
-        conn.commit()
-        conn.close()
     
     # ==================== CONFIG HISTORY ====================
     
@@ -452,7 +518,7 @@ class Database:
         ))
         
         conn.commit()
-        conn.close()
+        self._release_connection(conn)
     
     def get_config_history(self, limit: int = 10) -> List[Dict]:
         """Busca histórico de configurações"""
@@ -467,7 +533,7 @@ class Database:
         ''', (limit,))
         
         rows = cursor.fetchall()
-        conn.close()
+        self._release_connection(conn)
         
         return [dict(row) for row in rows]
     
@@ -481,7 +547,7 @@ class Database:
         
         cursor.execute(query, params)
         rows = cursor.fetchall()
-        conn.close()
+        self._release_connection(conn)
         
         return [dict(row) for row in rows]
     
@@ -493,7 +559,7 @@ class Database:
         
         cursor.execute(f"PRAGMA table_info({table_name})")
         rows = cursor.fetchall()
-        conn.close()
+        self._release_connection(conn)
         
         return [dict(row) for row in rows]
 
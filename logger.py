@@ -7,7 +7,31 @@ from datetime import datetime
 from typing import Dict, Optional
 from config import Config
 from database import Database
+from queue import Queue
 import os
+import threading
+
+# Colunas do CSV (mesma ordem no header e nas linhas)
+CSV_COLUMNS = (
+    'timestamp',
+    'symbol',
+    'entry_price',
+    'exit_price',
+    'quantity',
+    'pnl_pct',
+    'pnl_usdt',
+    'entry_time',
+    'exit_time',
+    'duration_seconds',
+    'reason',
+    'strategy',
+    'volume',
+    'stop_loss_pct',
+    'take_profit_pct'
+)
+
+# Sinaliza para a thread de escrita que não há mais trades
+_STOP = object()
 
 class TradeLogger:
     def __init__(self):
@@ -24,29 +48,18 @@ class TradeLogger:
         # Inicializa CSV
         if self.log_to_csv:
             self._init_csv()
+        
+        # CSV e SQLite são gravados numa thread própria: o loop principal não espera o disco
+        self.write_queue: Queue = Queue()
+        self.writer_thread = threading.Thread(target=self._write_loop, daemon=True)
+        self.writer_thread.start()
     
     def _init_csv(self):
         """Inicializa arquivo CSV com headers"""
         if not os.path.exists(self.csv_file):
             with open(self.csv_file, 'w', newline='', encoding='utf-8') as f:
                 writer = csv.writer(f)
-                writer.writerow([
-                    'timestamp',
-                    'symbol',
-                    'entry_price',
-                    'exit_price',
-                    'quantity',
-                    'pnl_pct',
-                    'pnl_usdt',
-                    'entry_time',
-                    'exit_time',
-                    'duration_seconds',
-                    'reason',
-                    'strategy',
-                    'volume',
-                    'stop_loss_pct',
-                    'take_profit_pct'
-                ])
+                writer.writerow(CSV_COLUMNS)
     
     
     def log_trade(self, trade_info: Dict):
@@ -96,46 +109,62 @@ class TradeLogger:
                 'take_profit_pct': Config.TAKE_PROFIT_PCT
             }
             
-            # Salva em CSV
-            if self.log_to_csv:
-                with open(self.csv_file, 'a', newline='', encoding='utf-8') as f:
-                    writer = csv.writer(f)
-                    writer.writerow([
-                        row_data['timestamp'],
-                        row_data['symbol'],
-                        row_data['entry_price'],
-                        row_data['exit_price'],
-                        row_data['quantity'],
-                        row_data['pnl_pct'],
-                        row_data['pnl_usdt'],
-                        row_data['entry_time'],
-                        row_data['exit_time'],
-                        row_data['duration_seconds'],
-                        row_data['reason'],
-                        row_data['strategy'],
-                        row_data['volume'],
-                        row_data['stop_loss_pct'],
-                        row_data['take_profit_pct']
-                    ])
-            
-            # Salva em DB usando o módulo database
-            if self.log_to_db and self.db:
-                try:
-                    self.db.insert_trade(row_data)
-                except Exception as e:
-                    print(f"❌ Erro ao salvar trade no banco: {e}")
+            # Gravação (CSV + DB) fica com a thread de escrita
+            self.write_queue.put(row_data)
             
             print(f"📝 Trade registrado: {trade_info['symbol']} | PnL: {trade_info['pnl_pct']:.2f}% (${trade_info['pnl_usdt']:.2f})")
             
         except Exception as e:
             print(f"❌ Erro ao registrar trade: {e}")
     
+    def _write_loop(self):
+        """Consome a fila de trades e grava no CSV e no banco"""
+        while True:
+            row_data = self.write_queue.get()
+            try:
+                if row_data is _STOP:
+                    return
+                self._write_trade(row_data)
+            finally:
+                self.write_queue.task_done()
+    
+    def _write_trade(self, row_data: Dict):
+        """Grava um trade já formatado no CSV e no banco"""
+        # Salva em CSV
+        if self.log_to_csv:
+            try:
+                with open(self.csv_file, 'a', newline='', encoding='utf-8') as f:
+                    writer = csv.writer(f)
+                    writer.writerow([row_data[column] for column in CSV_COLUMNS])
+            except Exception as e:
+                print(f"❌ Erro ao salvar trade no CSV: {e}")
+        
+        # Salva em DB usando o módulo database
+        if self.log_to_db and self.db:
+            try:
+                self.db.insert_trade(row_data)
+            except Exception as e:
+                print(f"❌ Erro ao salvar trade no banco: {e}")
+    
+    def flush(self):
+        """Aguarda a gravação de todos os trades pendentes"""
+        self.write_queue.join()
+    
+    def close(self):
+        """Grava os trades pendentes e encerra a thread de escrita"""
+        if self.writer_thread.is_alive():
+            self.write_queue.put(_STOP)
+            self.writer_thread.join()
+    
     def get_statistics(self, days: int = None) -> Dict:
         """Retorna estatísticas dos trades usando o módulo database"""
         try:
             if not self.log_to_db or not self.db:
                 return {}
             
+            # Estatísticas incluem trades ainda na fila
+            self.flush()
+            
             return self.db.get_statistics(days=days)
             
         except Exception as e:
@@ -2,6 +2,7 @@
 Bot de Scalping Automático - Main Runner
 """
 from binance.client import Client
+from requests.adapters import HTTPAdapter
 from market_scanner import MarketScanner
 from websocket_manager import WebSocketManager
 from strategy import ScalpingStrategy
@@ -9,6 +10,7 @@ from trade_executor import TradeExecutor
 from logger import TradeLogger
 from config import Config
 from status_logger import status_logger
+import json
 import time
 import signal
 import sys
@@ -23,6 +25,10 @@ class ScalpingBot:
             testnet=True  # Mude para True em testes
         )
         
+        # Pool de conexões maior para as threads do scanner reaproveitarem conexões TLS
+        adapter = HTTPAdapter(pool_connections=Config.HTTP_POOL_SIZE, pool_maxsize=Config.HTTP_POOL_SIZE)
+        self.client.session.mount('https://', adapter)
+        
         # Módulos
         self.scanner = MarketScanner(self.client)
         self.ws_manager = WebSocketManager(self.client)
@@ -33,6 +39,8 @@ class ScalpingBot:
         # Estado
         self.running = False
         self.selected_symbols = []
+        self.stop_event = threading.Event()  # Acorda o loop principal imediatamente no shutdown
+        self.first_pair_event = threading.Event()  # Sinalizado quando o scan encontra o 1º par
         
         # Setup signal handler para shutdown graceful
         signal.signal(signal.SIGINT, self.signal_handler)
@@ -42,6 +50,7 @@ class ScalpingBot:
         """Handler para shutdown graceful"""
         print("\n🛑 Parando bot...")
         self.running = False
+        self.stop_event.set()
         self.ws_manager.stop()
         sys.exit(0)
     
@@ -65,7 +74,7 @@ class ScalpingBot:
             return
         
         # Verifica sinal de entrada
-        signal_info = self.strategy.check_entry_signal(candles_1m, candles_5m)
+        signal_info = self.strategy.check_entry_signal(candles_1m, candles_5m, symbol)
         
         if signal_info and signal_info['signal'] == 'BUY':
             entry_price = signal_info['price']
@@ -119,15 +128,27 @@ class ScalpingBot:
     
     def monitor_positions(self):
         """Monitora posições abertas e verifica TP/SL"""
-        # Busca preços atuais
+        # Só precisa de preço dos símbolos com posição aberta
+        symbols = list(self.executor.active_positions.keys())
+        if not symbols:
+            return
+        
+        # Busca preços atuais de todos em uma única requisição
         current_prices = {}
         
-        for symbol in self.selected_symbols:
-            try:
-                ticker = self.client.get_ticker(symbol=symbol)
-                current_prices[symbol] = float(ticker['lastPrice'])
-            except:
-                continue
+        try:
+            tickers = self.client.get_symbol_ticker(symbols=json.dumps(symbols, separators=(',', ':')))
+            for ticker in tickers:
+                current_prices[ticker['symbol']] = float(ticker['price'])
+        except Exception as e:
+            # A Binance rejeita o lote inteiro se um símbolo falhar: busca um a um para
+            # que o TP/SL das demais posições continue sendo verificado
+            print(f"⚠️ Erro ao buscar preços em lote: {e}")
+            for symbol in symbols:
+                try:
+                    current_prices[symbol] = float(self.client.get_symbol_ticker(symbol=symbol)['price'])
+                except Exception:
+                    continue
         
         # Verifica posições
         closed_trades = self.executor.check_positions(current_prices)
@@ -175,6 +196,7 @@ class ScalpingBot:
                 if len(self.selected_symbols) == 1:
                     status_logger.print(f"🚀 Primeiro par encontrado: {symbol} - Iniciando operação...")
                     self._start_trading_for_symbol(symbol)
+                    self.first_pair_event.set()
                 elif len(self.selected_symbols) <= Config.MAX_PAIRS:
                     status_logger.print(f"✅ Par {len(self.selected_symbols)}/{Config.MAX_PAIRS}: {symbol}")
                     self._start_trading_for_symbol(symbol)
@@ -188,9 +210,7 @@ class ScalpingBot:
         
         # Aguarda pelo menos 1 par ser encontrado
         timeout = 60  # 60 segundos de timeout
-        start_time = time.time()
-        while len(self.selected_symbols) == 0 and (time.time() - start_time) < timeout:
-            time.sleep(0.5)
+        self.first_pair_event.wait(timeout)
         
         if not self.selected_symbols:
             status_logger.print("❌ Nenhum par encontrado. Encerrando...")
@@ -207,8 +227,9 @@ class ScalpingBot:
         
         # 4. Loop principal
         self.running = True
-        last_stats_time = time.time()
-        last_status_update = time.time()
+        # Relógio monotônico: ajustes no relógio do sistema não afetam os intervalos
+        last_stats_time = time.monotonic()
+        last_status_update = last_stats_time
         
         status_logger.print("\n🟢 Bot rodando... Aguardando sinais...\n")
         
@@ -216,24 +237,26 @@ class ScalpingBot:
             while self.running:
                 # Monitora posições a cada 1 segundo
                 self.monitor_positions()
+                now = time.monotonic()
                 
                 # Atualiza status a cada 5 segundos
-                if time.time() - last_status_update > 5:
+                if now - last_status_update > 5:
                     active_positions = len(self.executor.active_positions)
                     if active_positions > 0:
                         positions_str = ", ".join(self.executor.active_positions.keys())
                         status_logger.update(f"🟢 Bot ativo | {active_positions} posição(ões) aberta(s): {positions_str} | Aguardando sinais...")
                     else:
                         status_logger.update(f"🟢 Bot ativo | Nenhuma posição aberta | Monitorando {len(self.selected_symbols)} par(es)...")
-                    last_status_update = time.time()
+                    last_status_update = now
                 
                 # Imprime estatísticas a cada 5 minutos
-                if time.time() - last_stats_time > 300:
+                if now - last_stats_time > 300:
                     status_logger.clear()
                     self.print_statistics()
-                    last_stats_time = time.time()
+                    last_stats_time = now
                 
-                time.sleep(1)
+                # Espera 1 segundo, mas retorna na hora se o bot for parado
+                self.stop_event.wait(1)
                 
         except KeyboardInterrupt:
             status_logger.clear()
@@ -247,6 +270,7 @@ class ScalpingBot:
             #     self.executor.close_position(symbol, reason='BOT_STOPPED')
             
             self.ws_manager.stop()
+            self.logger.close()
             status_logger.clear()
             self.print_statistics()
             status_logger.print("\n👋 Bot encerrado")
@@ -271,6 +295,9 @@ if __name__ == '__main__':
         print("❌ ERRO: Configure BINANCE_API_KEY e BINANCE_API_SECRET no arquivo .env")
         sys.exit(1)
     
+    # Ajusta (e avisa) parâmetros que o websocket-client recusaria
+    Config.validate_ws_ping()
+    
     bot = ScalpingBot()
     bot.run()
 
@@ -2,12 +2,11 @@
 Scanner de mercado - seleciona os top pares mais voláteis
 """
 from binance.client import Client
-import pandas as pd
+import numpy as np
 from config import Config
 from status_logger import status_logger
-import threading
-from queue import Queue
-from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Optional, Tuple
 
 class MarketScanner:
     def __init__(self, client: Client):
@@ -49,32 +48,40 @@ class MarketScanner:
             if len(klines) < period:
                 return 0.0
             
-            closes = [float(k[4]) for k in klines]
-            returns = pd.Series(closes).pct_change().dropna()
+            # Conversão e retornos vetorizados (coluna 4 = close)
+            closes = np.array(klines, dtype=np.float64)[:, 4]
+            returns = np.diff(closes) / closes[:-1]
             
-            if len(returns) == 0:
+            if len(returns) < 2:
                 return 0.0
             
-            volatility = returns.std() * 100  # Em percentual
+            volatility = float(returns.std(ddof=1)) * 100  # Em percentual
             return volatility
             
         except Exception as e:
             print(f"Erro ao calcular volatilidade de {symbol}: {e}")
             return 0.0
     
-    def get_ticker_info(self, symbol: str) -> dict:
-        """Busca informações do ticker (volume, preço, spread)"""
+    def get_all_tickers(self) -> Dict[str, dict]:
+        """Busca o ticker 24h de todos os símbolos em uma única requisição"""
+        return {t['symbol']: t for t in self.client.get_ticker()}
+    
+    def get_all_book_tickers(self) -> Dict[str, Tuple[float, float]]:
+        """Busca melhor bid/ask de todos os símbolos em uma única requisição (bookTicker)"""
+        return {
+            t['symbol']: (float(t['bidPrice']), float(t['askPrice']))
+            for t in self.client.get_orderbook_tickers()
+        }
+    
+    def get_ticker_info(self, symbol: str, ticker: dict, book: Tuple[float, float]) -> dict:
+        """Extrai volume, preço e spread do ticker 24h e do melhor bid/ask já buscados em lote"""
         try:
-            ticker = self.client.get_ticker(symbol=symbol)
-            orderbook = self.client.get_order_book(symbol=symbol, limit=5)
-            
             price = float(ticker['lastPrice'])
             volume_24h = float(ticker['quoteVolume'])
             
-            # Calcula spread
-            if len(orderbook['bids']) > 0 and len(orderbook['asks']) > 0:
-                bid = float(orderbook['bids'][0][0])
-                ask = float(orderbook['asks'][0][0])
+            # Calcula spread (sem livro de ofertas = spread inviável)
+            bid, ask = book
+            if bid > 0 and ask > 0:
                 spread_pct = ((ask - bid) / bid) * 100
             else:
                 spread_pct = 999.0
@@ -90,27 +97,18 @@ class MarketScanner:
             print(f"Erro ao buscar info de {symbol}: {e}")
             return None
     
-    def _analyze_symbol(self, symbol: str, idx: int, total: int, results_queue: Queue):
-        """Analisa um símbolo individual (para threading)"""
+    def _analyze_symbol(self, symbol: str, idx: int, total: int, ticker: dict,
+                        book: Tuple[float, float]) -> Optional[dict]:
+        """Analisa um símbolo individual (para threading); retorna o par se passar nos filtros"""
         try:
             status_logger.update(f"Analisando {symbol}... ({idx}/{total})")
             
-            # Filtra stablecoins e símbolos excluídos
-            if symbol in Config.EXCLUDED_SYMBOLS:
-                return
-            
-            info = self.get_ticker_info(symbol)
+            # Excluídos, preço e volume mínimos já foram filtrados em scan_top_pairs
+            info = self.get_ticker_info(symbol, ticker, book)
             
             if not info:
                 return
             
-            # Filtros básicos
-            if info['price'] < Config.MIN_PRICE:
-                return
-            
-            if info['volume_24h'] < Config.MIN_VOLUME_24H:
-                return
-            
             if info['spread_pct'] > Config.MAX_SPREAD_PCT:
                 return
             
@@ -123,16 +121,17 @@ class MarketScanner:
                 return
             
             if volatility > 0:
-                results_queue.put({
+                return {
                     'symbol': symbol,
                     'price': info['price'],
                     'volume_24h': info['volume_24h'],
                     'spread_pct': info['spread_pct'],
                     'volatility': volatility
-                })
+                }
         except Exception as e:
             # Ignora erros individuais
             pass
+        return None
     
     def scan_top_pairs(self, callback=None) -> list:
         """
@@ -148,49 +147,51 @@ class MarketScanner:
         symbols = self.get_all_symbols()
         status_logger.print(f"📊 Encontrados {len(symbols)} pares {Config.BASE_CURRENCY}")
         
+        # Um único request para todos os tickers; filtros de preço/volume sem chamadas por símbolo
+        status_logger.update("Buscando tickers 24h...")
+        tickers = self.get_all_tickers()
+        
+        # Limites lidos uma vez (e não a cada símbolo); excluídos nem chegam a ser analisados
+        excluded = Config.EXCLUDED_SYMBOLS
+        min_price = Config.MIN_PRICE
+        min_volume = Config.MIN_VOLUME_24H
+        symbols = [
+            s for s in symbols
+            if s in tickers
+            and s not in excluded
+            and float(tickers[s]['lastPrice']) >= min_price
+            and float(tickers[s]['quoteVolume']) >= min_volume
+        ]
+        status_logger.print(f"📊 {len(symbols)} pares com preço e volume mínimos")
+        
+        # Melhor bid/ask de todos os pares de uma vez: o spread sai sem order book por símbolo
+        status_logger.update("Buscando melhores ofertas (bookTicker)...")
+        books = self.get_all_book_tickers()
+        
         valid_pairs = []
         total = len(symbols)
-        results_queue = Queue()
-        threads = []
-        max_threads = 10  # Limite de threads simultâneas
+        max_threads = 10  # Limite de análises simultâneas
         
         status_logger.update(f"Iniciando análise paralela de {total} pares...")
         
-        # Cria threads para análise paralela
-        for idx, symbol in enumerate(symbols, 1):
-            # Limita número de threads simultâneas
-            while threading.active_count() >= max_threads + 1:  # +1 para thread principal
-                threading.Event().wait(0.1)
-            
-            thread = threading.Thread(
-                target=self._analyze_symbol,
-                args=(symbol, idx, total, results_queue),
-                daemon=True
-            )
-            thread.start()
-            threads.append(thread)
-            
-            # Processa resultados encontrados enquanto analisa
-            while not results_queue.empty():
-                pair = results_queue.get()
+        # Pool fixo de threads: cada par é entregue assim que sua análise termina
+        with ThreadPoolExecutor(max_workers=max_threads) as executor:
+            futures = [
+                executor.submit(self._analyze_symbol, symbol, idx, total, tickers[symbol],
+                                books.get(symbol, (0.0, 0.0)))
+                for idx, symbol in enumerate(symbols, 1)
+            ]
+            
+            for future in as_completed(futures):
+                pair = future.result()
+                if not pair:
+                    continue
                 valid_pairs.append(pair)
                 
                 # Chama callback se fornecido (para começar a operar imediatamente)
                 if callback:
                     callback(pair['symbol'], pair)
         
-        # Aguarda todas as threads terminarem
-        status_logger.update("Aguardando conclusão da análise...")
-        for thread in threads:
-            thread.join()
-        
-        # Processa resultados finais
-        while not results_queue.empty():
-            pair = results_queue.get()
-            valid_pairs.append(pair)
-            if callback:
-                callback(pair['symbol'], pair)
-        
         # Ordena por volatilidade (maior primeiro)
         status_logger.update("Ordenando pares por volatilidade...")
         valid_pairs.sort(key=lambda x: x['volatility'], reverse=True)
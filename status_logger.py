@@ -2,14 +2,14 @@
 Logger de status em tempo real - atualiza na mesma linha
 """
 import sys
-from datetime import datetime
+import time
 
 class StatusLogger:
     """Logger que atualiza status na mesma linha"""
     
     def __init__(self):
         self.current_status = ""
-        self.last_update = None
+        self.last_update = None  # time.monotonic() da última atualização
     
     def update(self, message: str, show_time: bool = True):
         """
@@ -19,7 +19,8 @@ class StatusLogger:
             message: Mensagem a exibir
             show_time: Se True, mostra timestamp
         """
-        timestamp = datetime.now().strftime("%H:%M:%S") if show_time else ""
+        # time.strftime formata direto do relógio, sem criar um datetime por atualização
+        timestamp = time.strftime("%H:%M:%S") if show_time else ""
         status = f"[{timestamp}] {message}" if timestamp else message
         
         # Limpa a linha anterior completamente (150 caracteres) e escreve a nova
@@ -29,7 +30,7 @@ class StatusLogger:
         sys.stdout.flush()
         
         self.current_status = status
-        self.last_update = datetime.now()
+        self.last_update = time.monotonic()
     
     def print(self, message: str, show_time: bool = True):
         """
@@ -43,7 +44,7 @@ class StatusLogger:
         sys.stdout.write("\n")
         sys.stdout.flush()
         
-        timestamp = datetime.now().strftime("%H:%M:%S") if show_time else ""
+        timestamp = time.strftime("%H:%M:%S") if show_time else ""
         status = f"[{timestamp}] {message}" if timestamp else message
         
         print(status)
@@ -3,7 +3,7 @@ Estratégia de scalping: EMA 9/21 + volume + candle breakout
 """
 import pandas as pd
 import numpy as np
-from typing import Optional, Dict
+from typing import Optional, Dict, Tuple
 from config import Config
 
 class ScalpingStrategy:
@@ -11,18 +11,90 @@ class ScalpingStrategy:
         self.ema_fast = Config.EMA_FAST
         self.ema_slow = Config.EMA_SLOW
         self.volume_period = Config.VOLUME_PERIOD
+        self.er_period = Config.ER_PERIOD
+        self.min_efficiency_ratio = Config.MIN_EFFICIENCY_RATIO
+        # Estado incremental das EMAs: (símbolo, intervalo, período) -> (timestamp, EMA penúltima, EMA última)
+        self.ema_states: Dict[tuple, tuple] = {}
+        # Pesos da EMA em forma fechada: (período, tamanho da janela) -> vetor de pesos
+        self.ema_weights: Dict[tuple, np.ndarray] = {}
         
     def calculate_ema(self, prices: pd.Series, period: int) -> pd.Series:
         """Calcula EMA"""
         return prices.ewm(span=period, adjust=False).mean()
     
+    def _get_ema_weights(self, period: int, size: int) -> np.ndarray:
+        """
+        Pesos w tais que EMA final = w · closes (mesma EMA de ewm(adjust=False))
+        
+        w[0] = (1-α)^(n-1) (semente = primeiro close) e w[i] = α·(1-α)^(n-1-i)
+        """
+        key = (period, size)
+        weights = self.ema_weights.get(key)
+        if weights is None:
+            alpha = 2 / (period + 1)
+            weights = alpha * (1 - alpha) ** np.arange(size - 1, -1, -1, dtype=np.float64)
+            weights[0] = (1 - alpha) ** (size - 1)
+            self.ema_weights[key] = weights
+        return weights
+    
+    def last_emas(self, candles: pd.DataFrame, period: int,
+                  symbol: str = None, interval: str = None) -> Tuple[float, float]:
+        """
+        Retorna (EMA do penúltimo candle, EMA do último candle)
+        
+        Com símbolo e intervalo informados, guarda o estado e avança a EMA só com o candle
+        novo (s = s_ant + α·(close - s_ant)); recalcula sobre a janela inteira apenas na
+        primeira chamada ou se o buffer pular candles.
+        """
+        timestamps = candles['timestamp']
+        last_timestamp = timestamps.iat[-1]
+        key = (symbol, interval, period)
+        state = self.ema_states.get(key) if symbol else None
+        
+        if state is not None:
+            state_timestamp, prev_ema, last_ema = state
+            if state_timestamp == last_timestamp:
+                pass  # Mesmo candle regravado: refaz só o último passo
+            elif len(timestamps) > 1 and state_timestamp == timestamps.iat[-2]:
+                prev_ema = last_ema  # Um candle novo: avança um passo
+            else:
+                state = None  # Buffer pulou candles: recalcula do zero
+        
+        if state is None:
+            # Recalcula só os dois valores usados: um produto escalar cada, sem montar a série
+            closes = candles['close'].to_numpy(dtype=np.float64)
+            last_ema = float(np.dot(self._get_ema_weights(period, len(closes)), closes))
+            if len(closes) > 1:
+                prev_ema = float(np.dot(self._get_ema_weights(period, len(closes) - 1), closes[:-1]))
+            else:
+                prev_ema = last_ema
+        else:
+            alpha = 2 / (period + 1)
+            last_ema = prev_ema + alpha * (float(candles['close'].iat[-1]) - prev_ema)
+        
+        if symbol:
+            self.ema_states[key] = (last_timestamp, prev_ema, last_ema)
+        return prev_ema, last_ema
+    
     def calculate_volume_avg(self, volumes: pd.Series, period: int) -> float:
         """Calcula volume médio"""
         if len(volumes) < period:
             return volumes.mean()
         return volumes.tail(period).mean()
     
-    def check_trend_alignment(self, candles_5m: pd.DataFrame) -> bool:
+    def calculate_efficiency_ratio(self, closes: np.ndarray, period: int) -> float:
+        """
+        Efficiency Ratio de Kaufman: |variação líquida| / soma das variações absolutas
+        
+        Perto de 1 = movimento direcional; perto de 0 = mercado lateral (chop)
+        """
+        window = closes[-(period + 1):]
+        path = np.abs(np.diff(window)).sum()
+        if path <= 0:
+            return 0.0
+        return float(abs(window[-1] - window[0]) / path)
+    
+    def check_trend_alignment(self, candles_5m: pd.DataFrame, symbol: str = None) -> bool:
         """
         Verifica se a tendência no 5m está alinhada
         EMA 9 > EMA 21 no timeframe de tendência
@@ -30,39 +102,32 @@ class ScalpingStrategy:
         if len(candles_5m) < self.ema_slow:
             return False
         
-        closes = candles_5m['close']
-        ema_fast_5m = self.calculate_ema(closes, self.ema_fast)
-        ema_slow_5m = self.calculate_ema(closes, self.ema_slow)
-        
         # EMA rápida acima da lenta e inclinada pra cima
-        last_fast = ema_fast_5m.iloc[-1]
-        last_slow = ema_slow_5m.iloc[-1]
-        prev_fast = ema_fast_5m.iloc[-2] if len(ema_fast_5m) > 1 else last_fast
+        prev_fast, last_fast = self.last_emas(candles_5m, self.ema_fast, symbol, '5m')
+        _, last_slow = self.last_emas(candles_5m, self.ema_slow, symbol, '5m')
         
         return last_fast > last_slow and last_fast > prev_fast
     
-    def check_entry_signal(self, candles_1m: pd.DataFrame, candles_5m: pd.DataFrame) -> Optional[Dict]:
+    def check_entry_signal(self, candles_1m: pd.DataFrame, candles_5m: pd.DataFrame,
+                           symbol: str = None) -> Optional[Dict]:
         """
         Verifica se há sinal de entrada
         
+        Com o símbolo informado, as EMAs são atualizadas de forma incremental.
         Retorna dict com informações do sinal ou None
         """
         if len(candles_1m) < self.ema_slow or len(candles_5m) < self.ema_slow:
             return None
         
         # 1. Verifica alinhamento de tendência no 5m
-        if not self.check_trend_alignment(candles_5m):
+        if not self.check_trend_alignment(candles_5m, symbol):
             return None
         
         # 2. Calcula EMAs no 1m
-        closes_1m = candles_1m['close']
-        ema_fast_1m = self.calculate_ema(closes_1m, self.ema_fast)
-        ema_slow_1m = self.calculate_ema(closes_1m, self.ema_slow)
+        prev_fast_1m, last_fast_1m = self.last_emas(candles_1m, self.ema_fast, symbol, '1m')
+        _, last_slow_1m = self.last_emas(candles_1m, self.ema_slow, symbol, '1m')
         
         # 3. Verifica se EMA 9 > EMA 21 no 1m
-        last_fast_1m = ema_fast_1m.iloc[-1]
-        last_slow_1m = ema_slow_1m.iloc[-1]
-        prev_fast_1m = ema_fast_1m.iloc[-2] if len(ema_fast_1m) > 1 else last_fast_1m
         
         if not (last_fast_1m > last_slow_1m and last_fast_1m > prev_fast_1m):
             return None
@@ -71,31 +136,36 @@ class ScalpingStrategy:
         if len(candles_1m) < 2:
             return None
         
-        last_candle = candles_1m.iloc[-1]
-        prev_candle = candles_1m.iloc[-2]
+        # Lê só os escalares do candle (iloc de linha monta uma Series object a cada acesso)
+        last_close = candles_1m['close'].iat[-1]
+        prev_high = candles_1m['high'].iat[-2]
         
-        if last_candle['close'] <= prev_candle['high']:
+        if last_close <= prev_high:
             return None
         
         # 5. Verifica volume acima da média
         volumes = candles_1m['volume']
         volume_avg = self.calculate_volume_avg(volumes, self.volume_period)
-        last_volume = last_candle['volume']
+        last_volume = volumes.iat[-1]
         
         if last_volume <= volume_avg:
             return None
         
-        # 6. Todos os critérios atendidos - SINAL DE COMPRA
-        current_price = last_candle['close']
+        # 6. Verifica se o mercado está direcional (descarta lateralização)
+        if self.min_efficiency_ratio > 0:
+            closes_1m = candles_1m['close'].to_numpy(dtype=np.float64)
+            if self.calculate_efficiency_ratio(closes_1m, self.er_period) <= self.min_efficiency_ratio:
+                return None
         
+        # 7. Todos os critérios atendidos - SINAL DE COMPRA
         return {
             'signal': 'BUY',
-            'price': current_price,
+            'price': last_close,
             'ema_fast': last_fast_1m,
             'ema_slow': last_slow_1m,
             'volume': last_volume,
             'volume_avg': volume_avg,
-            'timestamp': last_candle['timestamp']
+            'timestamp': candles_1m['timestamp'].iat[-1]
         }
     
     def should_log_signal(self) -> bool:
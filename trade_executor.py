@@ -3,37 +3,141 @@ Executor de trades - compra/venda com TP/SL
 """
 from binance.client import Client
 from binance.exceptions import BinanceAPIException
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 from datetime import datetime
+from decimal import Decimal
 from config import Config
+import threading
 import time
 
 class TradeExecutor:
+    FILTERS_TTL = 3600  # Segundos até recarregar os filtros do exchange info
+    
     def __init__(self, client: Client):
         self.client = client
         self.trading_mode = Config.TRADING_MODE
         self.active_positions: Dict[str, Dict] = {}
+        self.symbol_filters: Dict[str, Dict] = {}  # Filtros já convertidos por símbolo
+        self.filters_lock = threading.Lock()  # Evita downloads duplicados do exchange info
+        self.filters_loaded_at = float('-inf')  # time.monotonic() da última carga
+        self.position_locks: Dict[str, threading.Lock] = {}  # Um lock por símbolo (abrir/fechar)
+        
+        # Endpoints e campos resolvidos uma vez conforme o modo (SPOT ou FUTURES)
+        if self.trading_mode == 'SPOT':
+            self._get_account = self.client.get_account
+            self._create_order = self.client.create_order
+            self._balances_field, self._free_field = 'balances', 'free'
+        else:
+            self._get_account = self.client.futures_account
+            self._create_order = self.client.futures_create_order
+            self._balances_field, self._free_field = 'assets', 'availableBalance'
         
     def get_account_balance(self, asset: str = 'USDT') -> float:
         """Retorna saldo disponível"""
         try:
-            if self.trading_mode == 'SPOT':
-                account = self.client.get_account()
-                for balance in account['balances']:
-                    if balance['asset'] == asset:
-                        return float(balance['free'])
-            else:
-                # FUTURES
-                account = self.client.futures_account()
-                for asset_balance in account['assets']:
-                    if asset_balance['asset'] == asset:
-                        return float(asset_balance['availableBalance'])
+            account = self._get_account()
+            for balance in account[self._balances_field]:
+                if balance['asset'] == asset:
+                    return float(balance[self._free_field])
             
             return 0.0
         except Exception as e:
             print(f"Erro ao buscar saldo: {e}")
             return 0.0
     
+    def get_symbol_filters(self, symbol: str) -> Dict:
+        """
+        Retorna filtros do símbolo (LOT_SIZE, PRICE_FILTER, NOTIONAL) já convertidos para float
+        
+        Na primeira consulta carrega os filtros de todos os símbolos de uma vez
+        e recarrega após FILTERS_TTL segundos
+        """
+        filters = self.symbol_filters.get(symbol)
+        if filters is None or self._filters_expired():
+            with self.filters_lock:
+                # Outra thread pode ter carregado enquanto esperávamos o lock
+                if symbol not in self.symbol_filters or self._filters_expired():
+                    self._load_symbol_filters()
+            filters = self.symbol_filters[symbol]
+        return filters
+    
+    def _filters_expired(self) -> bool:
+        """Relógio monotônico: ajustes no relógio do sistema não congelam nem forçam recargas"""
+        return time.monotonic() - self.filters_loaded_at > self.FILTERS_TTL
+    
+    def _load_symbol_filters(self):
+        """Busca o exchange info e guarda apenas os filtros já convertidos"""
+        exchange_info = self.client.get_exchange_info()
+        
+        # Troca o dict inteiro de uma vez (leitores nunca veem cache pela metade)
+        self.symbol_filters = {
+            s['symbol']: self._parse_filters(s.get('filters', ()))
+            for s in exchange_info['symbols']
+        }
+        self.filters_loaded_at = time.monotonic()
+    
+    @staticmethod
+    def _parse_filters(filter_list) -> Dict:
+        """Converte a lista de filtros do exchange info em valores numéricos"""
+        raw = {f['filterType']: f for f in filter_list}
+        
+        lot_size = raw.get('LOT_SIZE', {})
+        price_filter = raw.get('PRICE_FILTER', {})
+        notional = raw.get('NOTIONAL', raw.get('MIN_NOTIONAL', {}))
+        
+        # Casas decimais do step size derivadas da string (evita erro de ponto flutuante)
+        step = Decimal(lot_size.get('stepSize', '0'))
+        step_decimals = max(0, -step.normalize().as_tuple().exponent)
+        step_scale = 10 ** step_decimals
+        
+        return {
+            'step_size': float(lot_size.get('stepSize', 0)),
+            'step_scale': step_scale,
+            'step_int': int(step * step_scale),
+            'min_qty': float(lot_size.get('minQty', 0)),
+            'max_qty': float(lot_size.get('maxQty', 0)),
+            'tick_size': float(price_filter.get('tickSize', 0)),
+            'min_price': float(price_filter.get('minPrice', 0)),
+            'max_price': float(price_filter.get('maxPrice', 0)),
+            'min_notional': float(notional.get('minNotional', notional.get('notional', 0)))
+        }
+    
+    def round_quantity(self, symbol: str, quantity: float) -> float:
+        """Arredonda quantidade para baixo no step size usando aritmética inteira"""
+        filters = self.get_symbol_filters(symbol)
+        if not filters['step_int']:
+            return quantity
+        
+        scale = filters['step_scale']
+        
+        # Converte pelo repr (menor decimal que representa o float): 0.29 * 100 em float daria 28.999...
+        qty_int = int(Decimal(repr(quantity)) * scale)
+        qty_int -= qty_int % filters['step_int']
+        return qty_int / scale
+    
+    def validate_order(self, symbol: str, price: float, quantity: float) -> Tuple[bool, Optional[str]]:
+        """
+        Valida quantidade e notional contra os filtros do símbolo em uma única passada
+        
+        Retorna (válido, motivo da rejeição)
+        """
+        filters = self.get_symbol_filters(symbol)
+        
+        if quantity < filters['min_qty'] or quantity <= 0:
+            return False, f"quantidade {quantity} abaixo do mínimo {filters['min_qty']}"
+        
+        if filters['max_qty'] and quantity > filters['max_qty']:
+            return False, f"quantidade {quantity} acima do máximo {filters['max_qty']}"
+        
+        if price * quantity < filters['min_notional']:
+            return False, f"valor ${price * quantity:.2f} abaixo do notional mínimo ${filters['min_notional']:.2f}"
+        
+        return True, None
+    
+    def _position_lock(self, symbol: str) -> threading.Lock:
+        """Lock do símbolo (setdefault é atômico: duas threads nunca recebem locks diferentes)"""
+        return self.position_locks.setdefault(symbol, threading.Lock())
+    
     def has_active_position(self, symbol: str) -> bool:
         """Verifica se já existe posição aberta no símbolo"""
         return symbol in self.active_positions
@@ -42,83 +146,43 @@ class TradeExecutor:
         """Verifica se pode abrir nova posição"""
         return len(self.active_positions) < Config.MAX_TOTAL_POSITIONS
     
-    def buy_market(self, symbol: str, quantity: float) -> Optional[Dict]:
+    def _market_order(self, symbol: str, side: str, quantity: float) -> Optional[Dict]:
         """
-        Executa compra market
+        Executa ordem market (compra ou venda)
         
         Retorna dict com info da ordem ou None em caso de erro
         """
+        label = 'COMPRA' if side == 'BUY' else 'VENDA'
+        params = {'symbol': symbol, 'side': side, 'type': 'MARKET', 'quantity': quantity}
+        
         try:
-            if self.trading_mode == 'SPOT':
-                order = self.client.order_market_buy(
-                    symbol=symbol,
-                    quantity=quantity
-                )
-            else:
-                # FUTURES
-                order = self.client.futures_create_order(
-                    symbol=symbol,
-                    side='BUY',
-                    type='MARKET',
-                    quantity=quantity
-                )
+            order = self._create_order(**params)
             
-            print(f"✅ COMPRA executada: {symbol} | Qty: {quantity} | Preço: {order.get('price', 'N/A')}")
+            print(f"✅ {label} executada: {symbol} | Qty: {quantity} | Preço: {order.get('price', 'N/A')}")
             
             return {
                 'order_id': order['orderId'],
                 'symbol': symbol,
-                'side': 'BUY',
+                'side': side,
                 'quantity': float(order.get('executedQty', quantity)),
                 'price': float(order.get('price', order.get('avgPrice', 0))),
                 'timestamp': datetime.now()
             }
             
         except BinanceAPIException as e:
-            print(f"❌ Erro na compra de {symbol}: {e.message}")
+            print(f"❌ Erro na {label.lower()} de {symbol}: {e.message}")
             return None
         except Exception as e:
-            print(f"❌ Erro na compra de {symbol}: {e}")
+            print(f"❌ Erro na {label.lower()} de {symbol}: {e}")
             return None
     
+    def buy_market(self, symbol: str, quantity: float) -> Optional[Dict]:
+        """Executa compra market"""
+        return self._market_order(symbol, 'BUY', quantity)
+    
     def sell_market(self, symbol: str, quantity: float) -> Optional[Dict]:
-        """
-        Executa venda market
-        
-        Retorna dict com info da ordem ou None em caso de erro
-        """
-        try:
-            if self.trading_mode == 'SPOT':
-                order = self.client.order_market_sell(
-                    symbol=symbol,
-                    quantity=quantity
-                )
-            else:
-                # FUTURES
-                order = self.client.futures_create_order(
-                    symbol=symbol,
-                    side='SELL',
-                    type='MARKET',
-                    quantity=quantity
-                )
-            
-            print(f"✅ VENDA executada: {symbol} | Qty: {quantity} | Preço: {order.get('price', 'N/A')}")
-            
-            return {
-                'order_id': order['orderId'],
-                'symbol': symbol,
-                'side': 'SELL',
-                'quantity': float(order.get('executedQty', quantity)),
-                'price': float(order.get('price', order.get('avgPrice', 0))),
-                'timestamp': datetime.now()
-            }
-            
-        except BinanceAPIException as e:
-            print(f"❌ Erro na venda de {symbol}: {e.message}")
-            return None
-        except Exception as e:
-            print(f"❌ Erro na venda de {symbol}: {e}")
-            return None
+        """Executa venda market"""
+        return self._market_order(symbol, 'SELL', quantity)
     
     def open_position(self, symbol: str, entry_price: float, take_profit: float, stop_loss: float) -> bool:
         """
@@ -126,6 +190,12 @@ class TradeExecutor:
         
         Calcula quantidade baseada no saldo disponível e executa compra
         """
+        # Abertura e fechamento do mesmo símbolo nunca se intercalam (evita entrada/saída dupla)
+        with self._position_lock(symbol):
+            return self._open_position(symbol, entry_price, take_profit, stop_loss)
+    
+    def _open_position(self, symbol: str, entry_price: float, take_profit: float, stop_loss: float) -> bool:
+        """Abre a posição (chamado com o lock do símbolo)"""
         if not self.can_open_position():
             print(f"⚠️ Limite de posições atingido ({len(self.active_positions)}/{Config.MAX_TOTAL_POSITIONS})")
             return False
@@ -148,18 +218,14 @@ class TradeExecutor:
         
         # Arredonda quantidade conforme precisão do símbolo
         try:
-            exchange_info = self.client.get_exchange_info()
-            symbol_info = next(s for s in exchange_info['symbols'] if s['symbol'] == symbol)
-            step_size = None
-            
-            for filter_item in symbol_info['filters']:
-                if filter_item['filterType'] == 'LOT_SIZE':
-                    step_size = float(filter_item['stepSize'])
-                    break
+            # Arredonda para o step size
+            quantity = self.round_quantity(symbol, quantity)
             
-            if step_size:
-                # Arredonda para o step size
-                quantity = (quantity // step_size) * step_size
+            # Rejeita localmente ordens que a Binance recusaria pelos filtros
+            valid, reason = self.validate_order(symbol, entry_price, quantity)
+            if not valid:
+                print(f"⚠️ Ordem inválida para {symbol}: {reason}")
+                return False
             
             # Executa compra
             buy_order = self.buy_market(symbol, quantity)
@@ -187,6 +253,11 @@ class TradeExecutor:
         
         Retorna dict com info do trade completo ou None
         """
+        with self._position_lock(symbol):
+            return self._close_position(symbol, reason)
+    
+    def _close_position(self, symbol: str, reason: str) -> Optional[Dict]:
+        """Fecha a posição (chamado com o lock do símbolo)"""
         if symbol not in self.active_positions:
             return None
         
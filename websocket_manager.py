@@ -5,15 +5,43 @@ Suporta proxy e fallback para polling
 """
 from binance.client import Client
 import websocket
-import json
+import numpy as np
 import pandas as pd
 from datetime import datetime
 from typing import Dict, Callable
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue, Empty, Full
+import socket
 import threading
 import time
 from config import Config
 from status_logger import status_logger
 
+# orjson é bem mais rápido para decodificar as mensagens; json da stdlib como fallback
+# (ambos aceitam bytes direto, sem decode para str)
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    import json
+    json_loads = json.loads
+
+# Colunas OHLCV usadas pela estratégia (primeiras 6 posições do kline da Binance)
+CANDLE_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+# Candles mantidos por símbolo e intervalo (histórico inicial e buffer)
+CANDLE_BUFFER_SIZE = 100
+
+# Stream combinado: um único WebSocket recebe os klines de todos os intervalos do símbolo
+STREAM_BASE_URL = "wss://stream.binance.com:9443/stream?streams="
+
+# Limite da fila de callbacks: se o consumidor atrasar, descarta os mais antigos
+CALLBACK_QUEUE_SIZE = 1024
+
+# Campo "x" do kline: false enquanto o candle não fechou (só candles fechados são usados)
+# Em bytes: com skip_utf8_validation o on_message recebe o frame sem decodificar
+CANDLE_OPEN_MARKER = b'"x":false'
+
 class WebSocketManager:
     def __init__(self, client: Client):
         self.client = client
@@ -21,12 +49,59 @@ class WebSocketManager:
         self.connected_symbols = set()  # Rastreia símbolos já conectados
         self.candles_1m: Dict[str, pd.DataFrame] = {}
         self.candles_5m: Dict[str, pd.DataFrame] = {}
+        # Buffers por intervalo (lookup direto em vez de if/elif por mensagem)
+        self.candles_by_interval: Dict[str, Dict[str, pd.DataFrame]] = {
+            '1m': self.candles_1m,
+            '5m': self.candles_5m
+        }
         self.callbacks: Dict[str, Callable] = {}
         self.lock = threading.Lock()
         self.running = False
         self.use_polling = False  # Fallback para polling se WebSocket falhar
         self.polling_threads = []
+        # Opções do run_forever (constantes: calculadas uma vez)
+        self.run_options = {
+            # Desliga Nagle: frames pequenos saem/chegam sem esperar agrupamento
+            'sockopt': ((socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),),
+            # Pula validação e decode UTF-8: on_message recebe bytes, que vão direto ao parser
+            'skip_utf8_validation': True,
+            # Keepalive da própria lib: sem pong no timeout a conexão cai e passa pelo _on_error
+            'ping_interval': Config.WS_PING_INTERVAL,
+            'ping_timeout': Config.WS_PING_TIMEOUT,
+            **self._build_proxy_kwargs()
+        }
+        self.callback_queue = Queue(maxsize=CALLBACK_QUEUE_SIZE)  # (symbol, interval) aguardando callback
+        self.dropped_callbacks = 0
+        self.dropped_lock = threading.Lock()  # Várias threads de socket descartam ao mesmo tempo
+        self.dispatcher_thread = None
+        
+    @staticmethod
+    def _build_proxy_kwargs() -> dict:
+        """Monta os parâmetros de proxy do run_forever a partir da configuração"""
+        if not (Config.USE_PROXY and Config.PROXY_HOST):
+            return {}
         
+        return {
+            'http_proxy_host': Config.PROXY_HOST,
+            'http_proxy_port': int(Config.PROXY_PORT) if Config.PROXY_PORT else None,
+            'http_proxy_auth': (Config.PROXY_USER, Config.PROXY_PASS) if Config.PROXY_USER else None
+        }
+    
+    def _load_klines(self, symbol: str, interval: str) -> pd.DataFrame:
+        """Busca klines via REST e converte direto para um array float64"""
+        klines = self.client.get_klines(
+            symbol=symbol,
+            interval=interval,
+            limit=CANDLE_BUFFER_SIZE
+        )
+        
+        # Uma única conversão vetorizada (a Binance envia os preços como string)
+        data = np.array(klines, dtype=np.float64).reshape(-1, 12)[:, :len(CANDLE_COLUMNS)]
+        
+        df = pd.DataFrame(data, columns=CANDLE_COLUMNS)
+        df['timestamp'] = pd.to_datetime(df['timestamp'].astype('int64'), unit='ms')
+        return df
+    
     def initialize_candles(self, symbols: list):
         """Inicializa candles históricos para cada símbolo"""
         status_logger.print("📈 Carregando candles históricos...")
@@ -36,39 +111,12 @@ class WebSocketManager:
             try:
                 status_logger.update(f"Carregando {symbol}... ({idx}/{total})")
                 
-                # Carrega candles 1m
-                klines_1m = self.client.get_klines(
-                    symbol=symbol,
-                    interval='1m',
-                    limit=100
-                )
-                
-                df_1m = pd.DataFrame(klines_1m, columns=[
-                    'timestamp', 'open', 'high', 'low', 'close', 'volume',
-                    'close_time', 'quote_volume', 'trades', 'taker_buy_base',
-                    'taker_buy_quote', 'ignore'
-                ])
-                
-                df_1m['close'] = df_1m['close'].astype(float)
-                df_1m['volume'] = df_1m['volume'].astype(float)
-                df_1m['timestamp'] = pd.to_datetime(df_1m['timestamp'], unit='ms')
-                
-                # Carrega candles 5m
-                klines_5m = self.client.get_klines(
-                    symbol=symbol,
-                    interval='5m',
-                    limit=100
-                )
-                
-                df_5m = pd.DataFrame(klines_5m, columns=[
-                    'timestamp', 'open', 'high', 'low', 'close', 'volume',
-                    'close_time', 'quote_volume', 'trades', 'taker_buy_base',
-                    'taker_buy_quote', 'ignore'
-                ])
-                
-                df_5m['close'] = df_5m['close'].astype(float)
-                df_5m['volume'] = df_5m['volume'].astype(float)
-                df_5m['timestamp'] = pd.to_datetime(df_5m['timestamp'], unit='ms')
+                # 1m e 5m são independentes: busca os dois em paralelo
+                with ThreadPoolExecutor(max_workers=2) as pool:
+                    future_1m = pool.submit(self._load_klines, symbol, '1m')
+                    future_5m = pool.submit(self._load_klines, symbol, '5m')
+                    df_1m = future_1m.result()
+                    df_5m = future_5m.result()
                 
                 with self.lock:
                     self.candles_1m[symbol] = df_1m
@@ -82,62 +130,147 @@ class WebSocketManager:
     def process_candle_update(self, symbol: str, interval: str, kline_data: dict):
         """Processa atualização de candle via WebSocket"""
         try:
-            if not kline_data.get('x', False):  # Candle ainda não fechou
+            if not kline_data['x']:  # Candle ainda não fechou
                 return
             
-            candle_data = {
-                'timestamp': pd.to_datetime(kline_data['t'], unit='ms'),
-                'open': float(kline_data['o']),
-                'high': float(kline_data['h']),
-                'low': float(kline_data['l']),
-                'close': float(kline_data['c']),
-                'volume': float(kline_data['v'])
-            }
-            
-            with self.lock:
-                if interval == '1m':
-                    df = self.candles_1m.get(symbol)
-                    if df is not None:
-                        # Remove último candle (pode estar incompleto) e adiciona novo
-                        df = df.iloc[:-1] if len(df) > 0 else df
-                        new_row = pd.DataFrame([candle_data])
-                        df = pd.concat([df, new_row], ignore_index=True)
-                        # Mantém apenas últimos 100 candles
-                        df = df.tail(100).reset_index(drop=True)
-                        self.candles_1m[symbol] = df
-                        
-                elif interval == '5m':
-                    df = self.candles_5m.get(symbol)
-                    if df is not None:
-                        df = df.iloc[:-1] if len(df) > 0 else df
-                        new_row = pd.DataFrame([candle_data])
-                        df = pd.concat([df, new_row], ignore_index=True)
-                        df = df.tail(100).reset_index(drop=True)
-                        self.candles_5m[symbol] = df
-            
-            # Chama callback se existir
-            if symbol in self.callbacks:
-                self.callbacks[symbol](symbol, interval)
+            # Campos garantidos pelo schema do kline: acesso direto, sem .get com default
+            self.update_candle(
+                symbol, interval, kline_data['t'],
+                float(kline_data['o']), float(kline_data['h']), float(kline_data['l']),
+                float(kline_data['c']), float(kline_data['v'])
+            )
                 
         except Exception as e:
             print(f"Erro ao processar candle de {symbol}: {e}")
     
-    def _create_message_handler(self, symbol: str, interval: str):
-        """Cria handler de mensagens para um símbolo e intervalo específicos"""
+    def update_candle(self, symbol: str, interval: str, open_time: int,
+                      open_: float, high: float, low: float, close: float, volume: float) -> bool:
+        """
+        Grava um candle fechado no buffer do símbolo e agenda o callback.
+        
+        Idempotente pelo horário de abertura: substitui o último candle se for o mesmo
+        período, acrescenta se for mais novo e ignora candles antigos ou repetidos.
+        Retorna True apenas se o buffer mudou.
+        """
+        candles = self.candles_by_interval.get(interval)
+        if candles is None:
+            return False
+        
+        timestamp = pd.Timestamp(open_time, unit='ms')
+        values = [open_, high, low, close, volume]
+        
+        with self.lock:
+            df = candles.get(symbol)
+            if df is None:
+                return False
+            
+            if len(df) > 0:
+                last_timestamp = df['timestamp'].iat[-1]
+                if timestamp < last_timestamp:
+                    return False
+                if timestamp == last_timestamp:
+                    # Mesmo período: só regrava se o candle mudou (ex.: o histórico trouxe ele aberto)
+                    if df.iloc[-1, 1:].tolist() == values:
+                        return False
+                    df = df.iloc[:-1]
+            
+            # Descarta o mais antigo antes de juntar: o concat já monta o buffer final
+            if len(df) >= CANDLE_BUFFER_SIZE:
+                df = df.iloc[len(df) - CANDLE_BUFFER_SIZE + 1:]
+            
+            new_row = pd.DataFrame([[timestamp] + values], columns=CANDLE_COLUMNS)
+            candles[symbol] = pd.concat([df, new_row], ignore_index=True)
+        
+        # Callback roda na thread de dispatch: a thread do WebSocket volta a ler logo
+        if symbol in self.callbacks:
+            self._enqueue_callback(symbol, interval)
+        return True
+    
+    def _enqueue_callback(self, symbol: str, interval: str):
+        """Enfileira callback sem bloquear a thread de leitura (descarta o mais antigo se cheia)"""
+        # Vários produtores (uma thread WS por símbolo + polling): outro pode encher a fila
+        # entre o descarte e o put, então repete até conseguir enfileirar
+        while True:
+            try:
+                self.callback_queue.put_nowait((symbol, interval))
+                return
+            except Full:
+                try:
+                    self.callback_queue.get_nowait()
+                except Empty:
+                    continue
+                
+                with self.dropped_lock:
+                    self.dropped_callbacks += 1
+                    dropped = self.dropped_callbacks
+                if dropped % 100 == 1:
+                    status_logger.print(f"⚠️ Callbacks atrasados: {dropped} candle(s) descartado(s)")
+    
+    def _start_dispatcher(self):
+        """Inicia a thread única que executa os callbacks de candles"""
+        if self.dispatcher_thread and self.dispatcher_thread.is_alive():
+            return
+        
+        self.dispatcher_thread = threading.Thread(target=self._dispatch_callbacks, daemon=True)
+        self.dispatcher_thread.start()
+    
+    def _dispatch_callbacks(self):
+        """Consome a fila de candles fechados e chama os callbacks em lote"""
+        while self.running:
+            try:
+                batch = [self.callback_queue.get(timeout=1)]
+            except Empty:
+                continue
+            
+            # Drena tudo que já chegou; o mesmo (symbol, interval) repetido roda uma vez só
+            while True:
+                try:
+                    batch.append(self.callback_queue.get_nowait())
+                except Empty:
+                    break
+            
+            for symbol, interval in dict.fromkeys(batch):
+                try:
+                    callback = self.callbacks.get(symbol)
+                    if callback:
+                        callback(symbol, interval)
+                except Exception as e:
+                    print(f"Erro no callback de {symbol}: {e}")
+    
+    def _create_message_handler(self, symbol: str):
+        """Cria handler de mensagens do stream combinado de um símbolo"""
+        # Referências resolvidas uma vez, não a cada mensagem
+        process_candle_update = self.process_candle_update
+        loads = json_loads
+        open_marker = CANDLE_OPEN_MARKER
+        
         def handler(ws, message):
             try:
-                data = json.loads(message)
-                if 'k' in data:
-                    self.process_candle_update(symbol, interval, data['k'])
+                # Candle ainda aberto: descarta sem decodificar o JSON (a maioria das mensagens)
+                if open_marker in message:
+                    return
+                
+                # Só objetos JSON interessam: rejeita outros frames sem chamar o parser
+                if not message.startswith(b'{'):
+                    return
+                
+                # Formato combinado: {"stream": "...@kline_1m", "data": {..., "k": {...}}}
+                kline = loads(message).get('data', {}).get('k')
+                if kline:
+                    process_candle_update(symbol, kline['i'], kline)
             except Exception as e:
                 print(f"Erro ao processar mensagem WebSocket: {e}")
         return handler
     
     def _on_error(self, ws, error, symbol: str = None):
         """Handler de erros WebSocket"""
-        # Se for erro de conexão (firewall/proxy), ativa fallback
         error_str = str(error)
-        if symbol and ('10060' in error_str or 'timed out' in error_str.lower() or 'connection' in error_str.lower()):
+        # Keepalive sem pong ("ping/pong timed out"): a conexão caiu, não é bloqueio de
+        # firewall; reconecta normalmente em vez de mudar o símbolo para polling de vez
+        if symbol and 'ping/pong' in error_str:
+            threading.Timer(5.0, lambda: self._reconnect_symbol(symbol)).start()
+        # Se for erro de conexão (firewall/proxy), ativa fallback
+        elif symbol and ('10060' in error_str or 'timed out' in error_str.lower() or 'connection' in error_str.lower()):
             if not self.use_polling:
                 status_logger.print(f"🔄 Firewall bloqueando WebSocket. Ativando modo polling para {symbol}...")
                 self.use_polling = True
@@ -155,6 +288,17 @@ class WebSocketManager:
         """Handler de abertura WebSocket"""
         pass
     
+    def _create_ws(self, symbol: str) -> websocket.WebSocketApp:
+        """Cria o WebSocketApp com os streams de kline de todos os intervalos do símbolo"""
+        streams = '/'.join(f"{symbol.lower()}@kline_{interval}" for interval in self.candles_by_interval)
+        return websocket.WebSocketApp(
+            STREAM_BASE_URL + streams,
+            on_message=self._create_message_handler(symbol),
+            on_error=lambda ws, err: self._on_error(ws, err, symbol),
+            on_close=self._on_close,
+            on_open=self._on_open
+        )
+    
     def start_streams(self, symbols: list, callback: Callable):
         """Inicia streams WebSocket para todos os símbolos"""
         # Filtra símbolos já conectados
@@ -166,6 +310,7 @@ class WebSocketManager:
         status_logger.print("🔌 Conectando WebSockets...")
         
         self.running = True
+        self._start_dispatcher()
         
         total = len(new_symbols)
         for idx, symbol in enumerate(new_symbols, 1):
@@ -176,49 +321,13 @@ class WebSocketManager:
             self.callbacks[symbol] = callback
             
             try:
-                # Configura proxy se necessário
-                http_proxy = None
-                if Config.USE_PROXY and Config.PROXY_HOST:
-                    if Config.PROXY_USER:
-                        http_proxy = f"http://{Config.PROXY_USER}:{Config.PROXY_PASS}@{Config.PROXY_HOST}:{Config.PROXY_PORT}"
-                    else:
-                        http_proxy = f"http://{Config.PROXY_HOST}:{Config.PROXY_PORT}"
+                ws = self._create_ws(symbol)
                 
-                # Stream 1m
-                stream_url_1m = f"wss://stream.binance.com:9443/ws/{symbol.lower()}@kline_1m"
-                ws_1m = websocket.WebSocketApp(
-                    stream_url_1m,
-                    on_message=self._create_message_handler(symbol, '1m'),
-                    on_error=lambda ws, err: self._on_error(ws, err, symbol),
-                    on_close=self._on_close,
-                    on_open=self._on_open,
-                    http_proxy_host=Config.PROXY_HOST if Config.USE_PROXY else None,
-                    http_proxy_port=int(Config.PROXY_PORT) if Config.USE_PROXY and Config.PROXY_PORT else None,
-                    http_proxy_auth=(Config.PROXY_USER, Config.PROXY_PASS) if Config.USE_PROXY and Config.PROXY_USER else None
-                )
+                # Inicia WebSocket (1m + 5m na mesma conexão) em thread separada
+                thread = threading.Thread(target=ws.run_forever, kwargs=self.run_options, daemon=True)
+                thread.start()
                 
-                # Stream 5m
-                stream_url_5m = f"wss://stream.binance.com:9443/ws/{symbol.lower()}@kline_5m"
-                ws_5m = websocket.WebSocketApp(
-                    stream_url_5m,
-                    on_message=self._create_message_handler(symbol, '5m'),
-                    on_error=lambda ws, err: self._on_error(ws, err, symbol),
-                    on_close=self._on_close,
-                    on_open=self._on_open,
-                    http_proxy_host=Config.PROXY_HOST if Config.USE_PROXY else None,
-                    http_proxy_port=int(Config.PROXY_PORT) if Config.USE_PROXY and Config.PROXY_PORT else None,
-                    http_proxy_auth=(Config.PROXY_USER, Config.PROXY_PASS) if Config.USE_PROXY and Config.PROXY_USER else None
-                )
-                
-                # Inicia WebSockets em threads separadas
-                thread_1m = threading.Thread(target=ws_1m.run_forever, daemon=True)
-                thread_5m = threading.Thread(target=ws_5m.run_forever, daemon=True)
-                
-                thread_1m.start()
-                thread_5m.start()
-                
-                self.ws_connections.append((ws_1m, thread_1m, symbol))
-                self.ws_connections.append((ws_5m, thread_5m, symbol))
+                self.ws_connections.append((ws, thread, symbol))
             except Exception as e:
                 status_logger.print(f"⚠️ Erro ao conectar WebSocket para {symbol}: {e}")
                 self.connected_symbols.discard(symbol)  # Remove se falhou
@@ -233,12 +342,12 @@ class WebSocketManager:
     
     def get_candles(self, symbol: str, interval: str) -> pd.DataFrame:
         """Retorna candles do símbolo e intervalo especificados"""
-        with self.lock:
-            if interval == '1m':
-                return self.candles_1m.get(symbol, pd.DataFrame())
-            elif interval == '5m':
-                return self.candles_5m.get(symbol, pd.DataFrame())
+        candles = self.candles_by_interval.get(interval)
+        if candles is None:
             return pd.DataFrame()
+        
+        with self.lock:
+            return candles.get(symbol, pd.DataFrame())
     
     def _reconnect_symbol(self, symbol: str):
         """Reconecta WebSocket de um símbolo específico"""
@@ -262,35 +371,23 @@ class WebSocketManager:
         
         def poll_candles(symbol: str, interval: str):
             """Poll candles via API REST"""
-            last_update = {}
             while self.running:
                 try:
+                    # O último kline ainda está aberto: usa o penúltimo (último fechado)
                     klines = self.client.get_klines(
                         symbol=symbol,
                         interval=interval,
-                        limit=1
+                        limit=2
                     )
                     
-                    if klines:
-                        kline = klines[0]
-                        kline_id = f"{kline[0]}_{interval}"  # timestamp + interval como ID
-                        
-                        # Só processa se for novo
-                        if kline_id != last_update.get(symbol + interval):
-                            last_update[symbol + interval] = kline_id
-                            
-                            # Simula formato WebSocket
-                            kline_data = {
-                                't': int(kline[0]),  # timestamp
-                                'o': kline[1],  # open
-                                'h': kline[2],  # high
-                                'l': kline[3],  # low
-                                'c': kline[4],  # close
-                                'v': kline[5],  # volume
-                                'x': True  # candle fechado
-                            }
-                            
-                            self.process_candle_update(symbol, interval, kline_data)
+                    if len(klines) >= 2:
+                        kline = klines[-2]
+                        # Direto para o buffer; update_candle ignora candles já processados
+                        self.update_candle(
+                            symbol, interval, int(kline[0]),
+                            float(kline[1]), float(kline[2]), float(kline[3]),
+                            float(kline[4]), float(kline[5])
+                        )
                     
                     time.sleep(Config.POLLING_INTERVAL)
                 except Exception as e:
@@ -298,6 +395,7 @@ class WebSocketManager:
                     time.sleep(Config.POLLING_INTERVAL * 2)
         
         # Inicia threads de polling para cada símbolo e intervalo
+        self._start_dispatcher()
         for symbol in symbols:
             thread_1m = threading.Thread(target=poll_candles, args=(symbol, '1m'), daemon=True)
             thread_5m = threading.Thread(target=poll_candles, args=(symbol, '5m'), daemon=True)